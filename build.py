@@ -1,10 +1,37 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import sys
+import json
+import time
+import hashlib
+import argparse
 import platform
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+
+APP_NAME = "YouTube MP3 Downloader"
+SOURCE_FILE = "youtube_mp3_downloader_gui.py"
+CACHE_FILE = os.path.join("build", ".build-cache.json")
+
+# Requisitos das dependências; se já forem atendidos o pip não é executado.
+# O PyInstaller é fixado porque gera o executável; o yt-dlp não entra no build
+# (o app usa o yt-dlp do PATH), então qualquer versão a partir do mínimo serve
+# e o build nunca faz downgrade de um yt-dlp mais novo
+DEPENDENCIES = {
+    "pyinstaller": "==6.11.1",
+    "yt-dlp": ">=2024.12.13",
+}
+
+# Variantes do executável: nome final e opções do PyInstaller
+VARIANTS = {
+    "release": (APP_NAME, ["--onefile", "--windowed"]),
+    "console": (APP_NAME + " (console)", ["--onefile", "--console"]),
+    "onedir": (APP_NAME + " (onedir)", ["--onedir", "--windowed"]),
+}
 
 def check_python():
     """Verifica se o Python está instalado e é uma versão compatível"""
@@ -18,15 +45,35 @@ def check_python():
         print(f"✗ Erro ao verificar Python: {e}")
         return False
 
+def parse_version(version):
+    """Converte '2024.12.13' ou '6.11.1' em uma tupla comparável"""
+    return tuple(int(part) for part in re.findall(r"\d+", version)[:4])
+
+def installed_version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+def satisfies(version, requirement):
+    """Verifica se a versão instalada atende a '==X' ou '>=X'"""
+    wanted = parse_version(requirement[2:])
+    if requirement.startswith("=="):
+        return parse_version(version) == wanted
+    return parse_version(version) >= wanted
+
 def install_dependencies():
-    """Instala as dependências necessárias"""
-    print("\nInstalando dependências...")
-    dependencies = ["pyinstaller", "yt-dlp"]
+    """Instala as dependências cujas versões instaladas não atendem a DEPENDENCIES"""
+    print("\nVerificando dependências...")
     
-    for dep in dependencies:
+    for dep, requirement in DEPENDENCIES.items():
+        version = installed_version(dep)
+        if version and satisfies(version, requirement):
+            print(f"✓ {dep} {version} já instalado")
+            continue
         try:
-            print(f"Instalando {dep}...")
-            subprocess.run([sys.executable, "-m", "pip", "install", dep], 
+            print(f"Instalando {dep}{requirement}" + (f" (encontrado {version})..." if version else "..."))
+            subprocess.run([sys.executable, "-m", "pip", "install", f"{dep}{requirement}"], 
                          check=True, capture_output=True)
             print(f"✓ {dep} instalado com sucesso!")
         except subprocess.CalledProcessError as e:
@@ -68,35 +115,136 @@ def get_install_instructions():
             "package_manager": "Use o gerenciador de pacotes da sua distribuição"
         }
 
-def create_executable():
-    """Cria o executável usando PyInstaller"""
-    current_os = platform.system()
-    
-    print(f"\nCriando executável para {current_os}...")
-    
-    # Comando base do PyInstaller
-    cmd = [
-        sys.executable, "-m", "PyInstaller",
-        "--onefile",
-        "--windowed",
-        "--name", "YouTube MP3 Downloader",
-        "--clean",
-        "youtube_mp3_downloader_gui.py"
-    ]
+def pyinstaller_command(variant, clean=False):
+    """Monta o comando do PyInstaller para uma variante"""
+    name, options = VARIANTS[variant]
+    cmd = [sys.executable, "-m", "PyInstaller", *options, "--name", name, "--noconfirm"]
+    # Sem --clean o PyInstaller reaproveita a análise guardada em build/<nome>
+    if clean:
+        cmd.append("--clean")
     
     # Adicionar opções específicas por plataforma
-    if current_os == "Darwin":
+    if platform.system() == "Darwin":
         # Para macOS, adicionar opções específicas
         cmd.extend(["--osx-bundle-identifier", "com.youtubedownloader.app"])
     
+    cmd.append(SOURCE_FILE)
+    return cmd
+
+def executable_path(variant):
+    name, options = VARIANTS[variant]
+    filename = name + ".exe" if platform.system() == "Windows" else name
+    if "--onedir" in options:
+        return os.path.join("dist", name, filename)
+    return os.path.join("dist", filename)
+
+def build_hash(variant):
+    """Hash do código-fonte, das opções e das versões usadas no build"""
+    digest = hashlib.sha256()
+    with open(SOURCE_FILE, "rb") as file:
+        digest.update(file.read())
+    for part in (pyinstaller_command(variant)[3:] + [sys.version, installed_version("pyinstaller") or ""]):
+        digest.update(part.encode("utf-8"))
+    return digest.hexdigest()
+
+def load_cache():
     try:
-        subprocess.run(cmd, check=True)
-        return True
+        with open(CACHE_FILE, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    with open(CACHE_FILE, "w", encoding="utf-8") as file:
+        json.dump(cache, file, indent=2)
+
+def create_executable(variant, clean=False, log_path=None):
+    """Cria o executável de uma variante usando PyInstaller; retorna (sucesso, segundos)"""
+    print(f"\nCriando executável '{variant}' para {platform.system()}...")
+    
+    start = time.perf_counter()
+    try:
+        if log_path:
+            # Builds em paralelo gravam a saída em arquivo para não misturar no terminal
+            with open(log_path, "w", encoding="utf-8") as log_file:
+                subprocess.run(pyinstaller_command(variant, clean), check=True,
+                               stdout=log_file, stderr=subprocess.STDOUT)
+        else:
+            subprocess.run(pyinstaller_command(variant, clean), check=True)
+        return True, time.perf_counter() - start
     except subprocess.CalledProcessError as e:
-        print(f"✗ Erro ao criar executável: {e}")
-        return False
+        print(f"✗ Erro ao criar executável '{variant}': {e}")
+        if log_path:
+            print(f"  Detalhes em: {log_path}")
+        return False, time.perf_counter() - start
+
+def build_variants(variants, jobs, clean=False, force=False):
+    """Cria as variantes pedidas, pulando as que não mudaram desde o último build"""
+    cache = load_cache()
+    timings = {}
+    pending = []
+    
+    for variant in variants:
+        current_hash = build_hash(variant)
+        if not (force or clean) and cache.get(variant) == current_hash and os.path.exists(executable_path(variant)):
+            print(f"✓ '{variant}' sem alterações desde o último build, usando {executable_path(variant)}")
+            timings[variant] = ("em cache", 0.0)
+        else:
+            pending.append((variant, current_hash))
+    
+    parallel = min(jobs, len(pending)) > 1
+    
+    def run(item):
+        variant, current_hash = item
+        log_path = os.path.join("build", f"{variant}.log") if parallel else None
+        success, seconds = create_executable(variant, clean, log_path)
+        return variant, current_hash, success, seconds
+    
+    if pending:
+        os.makedirs("build", exist_ok=True)
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(pending)))) as executor:
+            for variant, current_hash, success, seconds in executor.map(run, pending):
+                if success and os.path.exists(executable_path(variant)):
+                    cache[variant] = current_hash
+                    timings[variant] = ("ok", seconds)
+                else:
+                    cache.pop(variant, None)
+                    timings[variant] = ("falhou", seconds)
+        save_cache(cache)
+    
+    return timings
+
+def print_usage_instructions(exe_path):
+    current_os = platform.system()
+    
+    if current_os == "Darwin":
+        escaped_path = exe_path.replace(' ', '\\ ')
+        print("\nPara usar:")
+        print("1. Abra o Finder")
+        print("2. Navegue até a pasta 'dist'")
+        print("3. Clique duas vezes no arquivo")
+        print(f"4. Ou via terminal: ./{escaped_path}")
+        
+    elif current_os == "Windows":
+        print("\nVocê pode mover este arquivo para o Desktop")
+        print("ou qualquer outro local de sua preferência.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cria o executável do YouTube MP3 Downloader")
+    parser.add_argument("--variant", action="append", choices=sorted(VARIANTS),
+                        help="variante a criar (pode repetir; padrão: release)")
+    parser.add_argument("--all", action="store_true", help="criar todas as variantes")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="builds simultâneos (padrão: número de CPUs)")
+    parser.add_argument("--clean", action="store_true", help="descartar o cache do PyInstaller e refazer tudo")
+    parser.add_argument("--force", action="store_true", help="recriar mesmo se o código não mudou")
+    args = parser.parse_args()
+    args.variants = sorted(VARIANTS) if args.all else list(dict.fromkeys(args.variant or ["release"]))
+    return args
 
 def main():
+    args = parse_args()
     current_os = platform.system()
     instructions = get_install_instructions()
     
@@ -111,7 +259,10 @@ def main():
         sys.exit(1)
     
     # Instalar dependências
-    if not install_dependencies():
+    deps_start = time.perf_counter()
+    deps_ok = install_dependencies()
+    deps_seconds = time.perf_counter() - deps_start
+    if not deps_ok:
         print("Falha ao instalar dependências.")
         sys.exit(1)
     
@@ -127,46 +278,39 @@ def main():
             sys.exit(1)
     
     # Verificar se o arquivo principal existe
-    if not os.path.exists("youtube_mp3_downloader_gui.py"):
-        print("✗ Arquivo 'youtube_mp3_downloader_gui.py' não encontrado!")
+    if not os.path.exists(SOURCE_FILE):
+        print(f"✗ Arquivo '{SOURCE_FILE}' não encontrado!")
         print("Certifique-se de que o arquivo está no mesmo diretório.")
         sys.exit(1)
     
-    # Criar executável
-    if create_executable():
-        # Verificar se foi criado
-        if current_os == "Windows":
-            exe_path = os.path.join("dist", "YouTube MP3 Downloader.exe")
-        else:
-            exe_path = os.path.join("dist", "YouTube MP3 Downloader")
-        
-        if os.path.exists(exe_path):
-            print("\n" + "=" * 60)
-            print("✓ Executável criado com sucesso!")
-            print(f"\nLocalização: {exe_path}")
-            
-            if current_os == "Darwin":
-                print("\nPara usar:")
-                print("1. Abra o Finder")
-                print("2. Navegue até a pasta 'dist'")
-                print("3. Clique duas vezes no arquivo")
-                print(f"4. Ou via terminal: ./{exe_path.replace(' ', '\\ ')}")
-                
-                # Tornar executável no macOS/Linux
-                os.chmod(exe_path, 0o755)
-                print("✓ Permissões de execução configuradas")
-                
-            elif current_os == "Windows":
-                print("\nVocê pode mover este arquivo para o Desktop")
-                print("ou qualquer outro local de sua preferência.")
-            
-            print("=" * 60)
-        else:
-            print("✗ Executável não foi encontrado após a criação.")
-            sys.exit(1)
-    else:
-        print("✗ Falha ao criar o executável.")
+    # Criar executáveis
+    build_start = time.perf_counter()
+    timings = build_variants(args.variants, args.jobs, clean=args.clean, force=args.force)
+    
+    print("\n" + "=" * 60)
+    print("Tempos de build:")
+    print(f"  {'dependências':<12} {deps_seconds:7.1f}s")
+    for variant in args.variants:
+        status, seconds = timings[variant]
+        print(f"  {variant:<12} {seconds:7.1f}s  {status}")
+    print(f"  {'total':<12} {time.perf_counter() - build_start + deps_seconds:7.1f}s")
+    print("=" * 60)
+    
+    failed = [variant for variant in args.variants if timings[variant][0] == "falhou"]
+    if failed:
+        print(f"✗ Falha ao criar: {', '.join(failed)}")
         sys.exit(1)
+    
+    print("\n✓ Executável criado com sucesso!")
+    for variant in args.variants:
+        exe_path = executable_path(variant)
+        print(f"\nLocalização ({variant}): {exe_path}")
+        if current_os == "Darwin":
+            # Tornar executável no macOS/Linux
+            os.chmod(exe_path, 0o755)
+            print("✓ Permissões de execução configuradas")
+    print_usage_instructions(executable_path(args.variants[0]))
+    print("=" * 60)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
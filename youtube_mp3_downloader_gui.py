@@ -1,9 +1,30 @@
 #!/usr/bin/env python3
 import os
 import sys
+import re
+import math
+import json
+import argparse
+import queue
+import asyncio
 import subprocess
 import platform
 import threading
+import contextvars
+import contextlib
+import collections
+import itertools
+import concurrent.futures
+import cProfile
+import pstats
+import io
+import time
+import struct
+import hashlib
+import ctypes
+import ctypes.util
+import http.cookiejar
+import tracemalloc
 import tempfile
 import shutil
 from pathlib import Path
@@ -16,12 +37,1572 @@ except ImportError:
     import tkinter as tk
     from tkinter import ttk, messagebox, filedialog
 
+QUALITIES = ["128k", "192k", "256k", "320k"]
+DEFAULT_DOWNLOAD_DIR = os.path.join(str(Path.home()), "Downloads")
+INVALID_FILENAME_CHARS = '<>:"/\\|?*'
+# Quanto cada codec rende por kbps em relação ao MP3
+CODEC_EFFICIENCY = {"opus": 1.4, "vorbis": 1.2, "mp4a": 1.2, "aac": 1.2, "mp3": 1.0}
+# Seleção usada quando o vídeo não lista streams só de áudio
+FALLBACK_FORMAT = "ba/b"
+DEFAULT_MIN_JOBS = 1
+DEFAULT_START_JOBS = 3
+DEFAULT_MAX_JOBS = 8
+# Controle adaptativo de concorrência: decide a cada ADAPT_INTERVAL segundos,
+# com uma amostra de vazão por ADAPT_SAMPLE segundos
+ADAPT_INTERVAL = 10
+ADAPT_SAMPLE = 1
+ADAPT_MAX_ERROR_RATE = 0.3
+ADAPT_MAX_LOAD = 0.9
+# Depois de uma redução o limite fica parado por esse tempo (segundos): a carga média
+# de 1 minuto e a janela de vazão precisam se renovar antes de refletir o novo limite
+ADAPT_DECREASE_COOLDOWN = 60
+THROTTLE_MARKERS = ("HTTP Error 429", "Too Many Requests", "not a bot")
+SIZE_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "KB": 1e3, "MB": 1e6, "GB": 1e9}
+SPEED_PATTERN = re.compile(r"\bat\s+([\d.]+)\s*(B|KiB|MiB|GiB|KB|MB|GB)/s")
+APP_DATA_DIR = os.path.join(str(Path.home()), ".youtube_mp3_downloader")
+SESSION_DIR = os.path.join(APP_DATA_DIR, "session")
+# Cache do áudio original (opcional): pasta e tamanho máximo padrão em MiB
+SOURCE_CACHE_DIR = os.path.join(APP_DATA_DIR, "sources")
+DEFAULT_SOURCE_CACHE_MB = 2048
+# Diretórios de download deixados no cache por uma execução interrompida são removidos
+# depois desse tempo (segundos); antes disso podem ser de outra instância ainda rodando
+SOURCE_CACHE_STALE_AGE = 24 * 3600
+# Extração de informações em lote: URLs por processo yt-dlp e processos simultâneos
+PREFETCH_CHUNK = 10
+PREFETCH_PROCESSES = 2
+# Informações extraídas e ainda não usadas por um job; um novo lote só começa quando
+# sobra espaço para ele, para não acumular memória nem links de stream vencidos
+PREFETCH_WINDOW = 20
+# Informações mais antigas que isso (segundos) são extraídas de novo: os links expiram
+PREFETCH_TTL = 15 * 60
+# Uma linha de -j (todas as informações de um vídeo) pode passar de 1 MiB
+PREFETCH_READ_LIMIT = 32 * 1024 * 1024
+# Modo pasta monitorada: intervalo da verificação por stat quando não há inotify
+# e espera para agrupar várias escritas seguidas no mesmo arquivo
+WATCH_POLL_INTERVAL = 5
+WATCH_DEBOUNCE = 0.5
+# Tempo sem alterações para considerar completa uma última linha sem quebra
+WATCH_SETTLE = 2
+# Saída dos processos filhos: lida em blocos binários; linhas maiores que o limite são truncadas
+# (sem --newline o progresso do yt-dlp usa \r sem \n)
+PIPE_CHUNK_SIZE = 64 * 1024
+PIPE_LINE_LIMIT = 4096
+LINE_BREAK = re.compile(rb"[\r\n]")
+# Progresso registrado no máximo uma vez por intervalo (segundos), por processo
+PROGRESS_LOG_INTERVAL = 1
+# Últimas linhas guardadas para a mensagem de erro
+PIPE_TAIL_LINES = 20
+# Perfil: novo snapshot do tracemalloc só se o pico crescer 10% e no máximo a cada 30s,
+# porque take_snapshot() é caro e distorceria o próprio perfil
+PROFILE_SNAPSHOT_GROWTH = 1.1
+PROFILE_SNAPSHOT_INTERVAL = 30
+# Capa embutida nos MP3: largura máxima em pixels e cache das miniaturas já reduzidas
+COVER_SIZE = 500
+THUMBNAIL_DIR = os.path.join(APP_DATA_DIR, "thumbnails")
+THUMBNAIL_CACHE_MB = 64
+
+_job_label = contextvars.ContextVar("job_label", default="")
+
+
+def parse_timestamp(value):
+    """Converte 'SS', 'MM:SS' ou 'HH:MM:SS' em segundos"""
+    parts = value.strip().split(":")
+    if not value.strip() or len(parts) > 3:
+        raise ValueError(f"Tempo inválido: {value!r}")
+    seconds = 0.0
+    for i, part in enumerate(parts):
+        try:
+            number = float(part)
+        except ValueError:
+            raise ValueError(f"Tempo inválido: {value!r}")
+        # Rejeita nan/inf e negativos; minutos e segundos abaixo de uma unidade maior vão até 59
+        if not math.isfinite(number) or number < 0 or (i > 0 and number >= 60):
+            raise ValueError(f"Tempo inválido: {value!r}")
+        seconds = seconds * 60 + number
+    return seconds
+
+
+def parse_section(start, end):
+    """Valida início/fim de um trecho e retorna (início, fim) em segundos"""
+    start_seconds = parse_timestamp(start) if start and start.strip() else 0.0
+    end_seconds = parse_timestamp(end) if end and end.strip() else None
+    if end_seconds is not None and end_seconds <= start_seconds:
+        raise ValueError("O fim do trecho deve ser maior que o início")
+    return start_seconds, end_seconds
+
+
+def safe_filename(name):
+    """Remove caracteres inválidos em nomes de arquivo no Windows/macOS/Linux"""
+    cleaned = "".join("_" if c in INVALID_FILENAME_CHARS or ord(c) < 32 else c for c in name)
+    return cleaned.strip(" .") or "audio"
+
+
+def parse_bitrate(quality):
+    """Converte '192k' em 192"""
+    return int(quality.lower().rstrip("k"))
+
+
+def format_size(num_bytes):
+    for unit in ["B", "KiB", "MiB"]:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GiB"
+
+
+def audio_bitrate(fmt):
+    return fmt.get("abr") or fmt.get("tbr") or 0
+
+
+def estimate_format_size(fmt, duration):
+    """Tamanho do stream em bytes, estimado pelo bitrate quando o YouTube não informa"""
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if not size and audio_bitrate(fmt) and duration:
+        size = audio_bitrate(fmt) * 1000 / 8 * duration
+    return size or 0
+
+
+def effective_bitrate(fmt):
+    """Bitrate equivalente em MP3, considerando a eficiência do codec"""
+    codec = fmt["acodec"].split(".")[0].lower()
+    return audio_bitrate(fmt) * CODEC_EFFICIENCY.get(codec, 1.0)
+
+
+def is_sufficient(fmt, quality):
+    """O stream basta para gerar o MP3 na qualidade pedida?"""
+    # Tolerância de 5%: o YouTube anuncia bitrates médios como 129.4k ou 126.8k
+    return effective_bitrate(fmt) >= parse_bitrate(quality) * 0.95
+
+
+def language_preference(fmt):
+    preference = fmt.get("language_preference")
+    return -1 if preference is None else preference
+
+
+def is_drc(fmt):
+    """Stream com compressão de faixa dinâmica (ex.: 140-drc)"""
+    return str(fmt.get("format_id", "")).endswith("-drc") or "drc" in (fmt.get("format_note") or "").lower()
+
+
+def select_audio_format(info, quality):
+    """Escolhe o menor stream só de áudio suficiente para gerar o MP3 na qualidade pedida.
+    
+    Codecs mais eficientes que o MP3 precisam de menos bitrate para a mesma qualidade
+    (um Opus de 96k equivale a um MP3 de ~128k). Retorna (escolhido, melhor áudio
+    disponível) ou (None, None) se o vídeo não tiver streams só de áudio.
+    """
+    duration = info.get("duration")
+    audio = [f for f in info.get("formats") or []
+             if f.get("vcodec") == "none" and f.get("acodec") not in (None, "none")
+             and audio_bitrate(f) and not f.get("has_drm")]
+    if not audio:
+        return None, None
+    
+    # Em vídeos com várias faixas de áudio, só as do idioma preferido (o original, não
+    # uma dublagem), e sem as versões com compressão de faixa dinâmica (DRC) se houver outras
+    preference = max(language_preference(f) for f in audio)
+    audio = [f for f in audio if language_preference(f) == preference]
+    audio = [f for f in audio if not is_drc(f)] or audio
+    
+    # O que o yt-dlp baixaria por padrão ("bestaudio")
+    best = max(audio, key=lambda f: (audio_bitrate(f), estimate_format_size(f, duration)))
+    sufficient = [f for f in audio if is_sufficient(f, quality)]
+    if not sufficient:
+        return best, best
+    chosen = min(sufficient, key=lambda f: (estimate_format_size(f, duration), audio_bitrate(f)))
+    return chosen, best
+
+
+def select_thumbnail(info, size=COVER_SIZE):
+    """Escolhe a menor miniatura com pelo menos `size` pixels de largura, para baixar menos bytes"""
+    thumbnails = [t for t in info.get("thumbnails") or [] if t.get("url") and t.get("width")]
+    large = [t for t in thumbnails if t["width"] >= size]
+    if large:
+        return min(large, key=lambda t: t["width"])["url"]
+    if thumbnails:
+        return max(thumbnails, key=lambda t: t["width"])["url"]
+    return info.get("thumbnail")
+
+
+def audio_tags(info, album=None, track=None, title=None):
+    """Tags ID3 de um vídeo; álbum e faixa vêm da playlist (ou do vídeo, no modo capítulos)"""
+    tags = {
+        "title": title or info.get("track") or info.get("title"),
+        "artist": info.get("artist") or info.get("uploader") or info.get("channel"),
+        "album": album or info.get("album"),
+        "track": track,
+        "comment": info.get("webpage_url") or info.get("original_url"),
+    }
+    return {key: str(value) for key, value in tags.items() if value}
+
+
+class SessionStore:
+    """Cookie jar do yt-dlp compartilhado entre jobs e entre execuções.
+    
+    Cada processo recebe uma cópia do jar compartilhado e, ao terminar, só os
+    cookies que ele criou ou alterou em relação a essa cópia voltam ao jar, para
+    que um job longo não desfaça cookies renovados por outro job nesse meio-tempo.
+    O cache do player (funções de assinatura) fica no cache padrão do yt-dlp,
+    que já é persistente e compartilhado por todos os processos.
+    """
+
+    NETSCAPE_HEADER = "# Netscape HTTP Cookie File\n"
+
+    def __init__(self, root=SESSION_DIR):
+        self.root = root
+        self.cookie_file = os.path.join(root, "cookies.txt")
+        self.lock = None
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def load_jar(path, strict=False):
+        """Carrega um cookie jar Netscape; erros geram um jar vazio, exceto com strict"""
+        jar = http.cookiejar.MozillaCookieJar()
+        try:
+            jar.load(path, ignore_discard=True, ignore_expires=True)
+        except (OSError, http.cookiejar.LoadError):
+            # LoadError é subclasse de OSError
+            if strict:
+                raise
+        return jar
+
+    @staticmethod
+    def cookie_values(jar):
+        """Valor e validade de cada cookie, indexados por (domínio, caminho, nome)"""
+        return {(c.domain, c.path, c.name): (c.value, c.expires) for c in jar}
+
+    def save_jar(self, jar):
+        jar.save(self.cookie_file, ignore_discard=True, ignore_expires=True)
+        os.chmod(self.cookie_file, 0o600)
+
+    def merge_cookies(self, path, strict=False, baseline=None):
+        """Mescla os cookies de path no jar compartilhado e retorna quantos há.
+        
+        Com baseline (ver cookie_values), só entram os cookies novos ou diferentes
+        dele. Erros no jar compartilhado ou na cópia de um job são ignorados; com
+        strict=True um arquivo path ausente ou fora do formato Netscape gera OSError.
+        """
+        incoming = self.load_jar(path, strict)
+        jar = self.load_jar(self.cookie_file)
+        for cookie in incoming:
+            key = (cookie.domain, cookie.path, cookie.name)
+            if baseline is None or baseline.get(key) != (cookie.value, cookie.expires):
+                jar.set_cookie(cookie)
+        self.save_jar(jar)
+        return len(jar)
+
+    @contextlib.asynccontextmanager
+    async def command(self, cmd):
+        """Acrescenta uma cópia do cookie jar a um comando do yt-dlp"""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        fd, job_cookies = tempfile.mkstemp(prefix="cookies-", suffix=".txt")
+        os.close(fd)
+        try:
+            async with self.lock:
+                if os.path.exists(self.cookie_file):
+                    shutil.copyfile(self.cookie_file, job_cookies)
+                else:
+                    with open(job_cookies, "w") as file:
+                        file.write(self.NETSCAPE_HEADER)
+                baseline = self.cookie_values(self.load_jar(job_cookies))
+            yield cmd[:1] + ["--cookies", job_cookies] + cmd[1:]
+            async with self.lock:
+                self.merge_cookies(job_cookies, baseline=baseline)
+        finally:
+            os.remove(job_cookies)
+
+
+class SourceCache:
+    """Cache em disco do áudio original baixado, por ID do vídeo e formato.
+    
+    Um vídeo repetido em várias playlists é servido localmente, e também uma nova
+    conversão em outra qualidade quando algum formato já em cache (codec e bitrate)
+    basta para ela. Ao passar do tamanho máximo, os arquivos usados há mais
+    tempo são removidos primeiro (LRU), exceto os que estão sendo convertidos.
+    """
+
+    TEMP_PREFIX = ".download-"
+
+    def __init__(self, max_bytes=DEFAULT_SOURCE_CACHE_MB * 1024 ** 2, directory=SOURCE_CACHE_DIR):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        self.entries = self.load_index()
+        self.locks = {}
+        # Arquivos do cache em uso por uma conversão: não podem ser removidos
+        self.in_use = collections.Counter()
+        self.remove_stale_downloads()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+
+    def load_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        # Descarta entradas cujo arquivo foi apagado por fora
+        return {key: entry for key, entry in entries.items()
+                if "video" in entry and os.path.exists(os.path.join(self.directory, entry["file"]))}
+
+    def remove_stale_downloads(self):
+        """Apaga diretórios temporários de downloads interrompidos (ex.: o app foi encerrado à força)"""
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if (entry.name.startswith(self.TEMP_PREFIX) and entry.is_dir()
+                        and now - entry.stat().st_mtime > SOURCE_CACHE_STALE_AGE):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+    def temp_dir(self):
+        """Diretório temporário para um download, no mesmo disco do cache"""
+        return tempfile.mkdtemp(prefix=self.TEMP_PREFIX, dir=self.directory)
+
+    def save_index(self):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file)
+        os.replace(temp_path, self.index_path)
+
+    def lock(self, video_id):
+        """Jobs com o mesmo vídeo esperam um pelo outro; o segundo encontra o áudio no cache"""
+        return self.locks.setdefault(video_id, asyncio.Lock())
+
+    def get(self, video_id, format_id, quality):
+        """Retorna o caminho do menor áudio em cache que sirva para a qualidade, marcando o uso, ou None.
+        
+        Serve o formato escolhido para esta conversão ou qualquer outro do mesmo vídeo
+        com codec e bitrate suficientes. O arquivo fica protegido da remoção até release().
+        """
+        for key in [key for key, entry in self.entries.items()
+                    if not os.path.exists(os.path.join(self.directory, entry["file"]))]:
+            del self.entries[key]
+        candidates = [entry for entry in self.entries.values() if entry["video"] == video_id
+                      and (entry["format_id"] == format_id or is_sufficient(entry, quality))]
+        if not candidates:
+            self.misses += 1
+            return None
+        entry = min(candidates, key=lambda e: e["size"])
+        entry["used"] = time.time()
+        self.save_index()
+        self.hits += 1
+        self.bytes_served += entry["size"]
+        self.in_use[entry["file"]] += 1
+        return os.path.join(self.directory, entry["file"])
+
+    def put(self, video_id, fmt, source):
+        """Move o áudio baixado (no formato fmt) para o cache e retorna o novo caminho.
+        
+        O diretório temporário do download fica dentro do cache, então a cópia é só uma
+        renomeação. Como em get(), o arquivo fica protegido até release().
+        """
+        key = f"{video_id}-{fmt['format_id']}"
+        name = safe_filename(key) + os.path.splitext(source)[1]
+        path = os.path.join(self.directory, name)
+        os.replace(source, path)
+        self.entries[key] = {"file": name, "size": os.path.getsize(path), "used": time.time(),
+                             "video": video_id, "format_id": fmt["format_id"],
+                             "acodec": fmt["acodec"], "abr": audio_bitrate(fmt)}
+        self.in_use[name] += 1
+        self.evict()
+        return path
+
+    def release(self, path):
+        """Libera um arquivo devolvido por get()/put() depois da conversão"""
+        name = os.path.basename(path)
+        if name not in self.in_use:
+            # Trecho baixado fora do cache
+            return
+        if self.in_use[name] <= 1:
+            self.in_use.pop(name, None)
+            # Arquivos protegidos podem ter deixado o cache acima do limite
+            self.evict()
+        else:
+            self.in_use[name] -= 1
+
+    def evict(self):
+        """Remove os arquivos menos usados até o cache caber no tamanho máximo"""
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            if self.in_use[self.entries[key]["file"]]:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, self.entries[key]["file"]))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Arquivo aberto por outro processo (Windows): fica no índice para a próxima vez
+                continue
+            total -= self.entries.pop(key)["size"]
+        self.save_index()
+
+    def stats(self):
+        return self.hits, self.misses, self.bytes_served
+
+
+class ThumbnailCache:
+    """Cache em disco das capas já reduzidas, uma por URL de miniatura.
+    
+    A data de modificação de cada arquivo marca o último uso; ao passar do tamanho
+    máximo, as capas usadas há mais tempo são removidas (LRU), exceto as que estão
+    sendo embutidas em um MP3.
+    """
+
+    def __init__(self, max_bytes=THUMBNAIL_CACHE_MB * 1024 ** 2, directory=THUMBNAIL_DIR):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.in_use = collections.Counter()
+
+    def path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + ".jpg")
+
+    def acquire(self, path):
+        """Marca a capa como usada agora e a protege até release(); False se não existe"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self.in_use[path] += 1
+        return True
+
+    def release(self, path):
+        if self.in_use[path] > 1:
+            self.in_use[path] -= 1
+        else:
+            del self.in_use[path]
+
+    def evict(self):
+        """Remove as capas menos usadas até o cache caber no tamanho máximo"""
+        files = []
+        with contextlib.suppress(FileNotFoundError), os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".jpg"):
+                    with contextlib.suppress(FileNotFoundError):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if self.in_use[path]:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= size
+
+
+class Inotify:
+    """Acesso mínimo ao inotify do Linux via ctypes (sem dependências externas)"""
+
+    IN_MODIFY = 0x00000002
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        mask = self.IN_MODIFY | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch falhou para {folder}")
+
+    def read_events(self):
+        """Lê os eventos pendentes e retorna os nomes alterados; None se a fila transbordou"""
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            pos = 0
+            while pos + self.EVENT_HEADER.size <= len(data):
+                _, mask, _, length = self.EVENT_HEADER.unpack_from(data, pos)
+                pos += self.EVENT_HEADER.size
+                name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+                pos += length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                if name:
+                    changed.add(name)
+
+    def close(self):
+        os.close(self.fd)
+
+
+async def read_lines(stream, limit=PIPE_LINE_LIMIT):
+    """Lê a saída binária de um processo em blocos e gera as linhas separadas por \\r ou \\n.
+    
+    Uma linha maior que `limit` é truncada e o restante é descartado até a próxima quebra,
+    então a memória usada por processo fica limitada a um bloco mais uma linha.
+    """
+    buffer = b""
+    skipping = False
+    while True:
+        chunk = await stream.read(PIPE_CHUNK_SIZE)
+        if not chunk:
+            break
+        *lines, buffer = LINE_BREAK.split(buffer + chunk)
+        for line in lines:
+            if skipping:
+                # Fim de uma linha já truncada
+                skipping = False
+            elif line:
+                yield line[:limit]
+        if len(buffer) > limit:
+            if not skipping:
+                yield buffer[:limit]
+            skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        yield buffer[:limit]
+
+
+def is_progress_line(line):
+    return line.startswith(b"[download]") and b"%" in line
+
+
+def is_url_file(name):
+    return name.lower().endswith(".txt") and not name.startswith(".")
+
+
+class FolderWatcher:
+    """Observa uma pasta e entrega as URLs acrescentadas aos arquivos .txt.
+    
+    Guarda até onde cada arquivo já foi lido (em APP_DATA_DIR), então arquivos
+    novos são lidos por inteiro e arquivos existentes só a partir do trecho
+    acrescentado, inclusive entre execuções. A continuidade é decidida pelo conteúdo:
+    se o trecho já lido mudou, o arquivo foi substituído e é lido desde o início; se
+    não mudou, só o acréscimo é lido, mesmo que o arquivo tenha sido salvo por cima
+    (editores, rsync e serviços de sincronização gravam um novo arquivo e renomeiam).
+    As URLs lidas ficam em uma fila persistida até o download terminar, então as
+    que estavam na fila quando o monitoramento foi cancelado voltam na próxima execução.
+    Usa inotify quando disponível e, nos outros sistemas, verificação por stat a cada
+    WATCH_POLL_INTERVAL segundos.
+    """
+
+    def __init__(self, folder, poll_interval=WATCH_POLL_INTERVAL):
+        self.folder = os.path.abspath(folder)
+        self.poll_interval = poll_interval
+        folder_key = hashlib.sha1(self.folder.encode("utf-8")).hexdigest()[:12]
+        self.state_path = os.path.join(APP_DATA_DIR, f"watch-{folder_key}.json")
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            state = {}
+        self.offsets = state.get("files", {})
+        self.pending = state.get("pending", [])
+        # Arquivos com uma última linha ainda sem quebra, aguardando WATCH_SETTLE
+        self.partial = set()
+        
+        self.inotify = None
+        if sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify(self.folder)
+            except (OSError, AttributeError):
+                pass
+        self.mode = "inotify" if self.inotify else f"verificação a cada {poll_interval}s"
+
+    def save_state(self):
+        os.makedirs(APP_DATA_DIR, exist_ok=True)
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"files": self.offsets, "pending": self.pending}, file)
+        os.replace(temp_path, self.state_path)
+
+    def finish(self, url):
+        """Tira da fila persistida uma URL cujo download terminou (com sucesso ou erro)"""
+        with contextlib.suppress(ValueError):
+            self.pending.remove(url)
+            self.save_state()
+
+    def known_offset(self, name, content):
+        """Até onde o arquivo já foi lido, ou 0 se o trecho já lido mudou (arquivo substituído)"""
+        state = self.offsets.get(name)
+        if not isinstance(state, dict) or len(content) < state["offset"]:
+            return 0
+        if hashlib.sha1(content[:state["offset"]]).hexdigest() != state.get("digest"):
+            return 0
+        return state["offset"]
+
+    def read_new_urls(self, name, complete=False):
+        """Lê as linhas acrescentadas desde a última leitura.
+        
+        Uma última linha sem quebra só é considerada quando complete=True (o
+        arquivo parou de mudar), para não pegar uma URL pela metade.
+        """
+        path = os.path.join(self.folder, name)
+        try:
+            with open(path, "rb") as file:
+                content = file.read()
+        except OSError:
+            return []
+        # Listas de URLs são pequenas: o arquivo é lido inteiro para conferir o trecho já lido
+        offset = self.known_offset(name, content)
+        data = content[offset:]
+        end = len(data) if complete else data.rfind(b"\n") + 1
+        if end < len(data):
+            self.partial.add(name)
+        else:
+            self.partial.discard(name)
+        if not end:
+            return []
+        self.offsets[name] = {"offset": offset + end, "digest": hashlib.sha1(content[:offset + end]).hexdigest()}
+        
+        lines = data[:end].decode("utf-8", "replace").splitlines()
+        urls = [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+        # O avanço do offset e a entrada na fila são gravados juntos
+        self.pending.extend(urls)
+        self.save_state()
+        return urls
+
+    def scan(self):
+        """Retorna {nome: (tamanho, mtime)} dos arquivos de URLs da pasta"""
+        files = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if is_url_file(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    async def watch(self):
+        """Gera (arquivo, URLs novas) conforme os arquivos da pasta mudam"""
+        # Primeiro as URLs que não terminaram na execução anterior e o que já estava na pasta
+        if self.pending:
+            yield "pendentes da execução anterior", list(self.pending)
+        previous = self.scan()
+        for name in sorted(previous):
+            urls = self.read_new_urls(name, complete=True)
+            if urls:
+                yield name, urls
+        
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        if self.inotify:
+            loop.add_reader(self.inotify.fd, ready.set)
+        try:
+            while True:
+                if self.inotify:
+                    try:
+                        await asyncio.wait_for(ready.wait(), WATCH_SETTLE if self.partial else None)
+                    except asyncio.TimeoutError:
+                        # Nenhum evento desde a última leitura: as linhas pendentes estão completas
+                        changed = dict.fromkeys(self.partial, True)
+                    else:
+                        # Agrupa rajadas de escrita no mesmo arquivo antes de ler
+                        await asyncio.sleep(WATCH_DEBOUNCE)
+                        ready.clear()
+                        names = self.inotify.read_events()
+                        changed = dict.fromkeys(self.scan() if names is None else names, False)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+                    current = self.scan()
+                    # Só lê arquivos novos ou alterados, e os que esperam uma última linha sem quebra:
+                    # sem mudanças desde a última verificação, essa linha está completa
+                    changed = {name: name in self.partial and previous.get(name) == signature
+                               for name, signature in current.items()
+                               if previous.get(name) != signature or name in self.partial}
+                    previous = current
+                
+                for name, complete in sorted(changed.items()):
+                    if is_url_file(name):
+                        urls = self.read_new_urls(name, complete=complete)
+                        if urls:
+                            yield name, urls
+        finally:
+            if self.inotify:
+                loop.remove_reader(self.inotify.fd)
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+
+def cpu_load():
+    """Carga média do último minuto por CPU, ou None onde não há getloadavg (Windows)"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class ConcurrencyController:
+    """Ajusta quantos downloads rodam ao mesmo tempo, entre min_jobs e max_jobs (AIMD).
+    
+    A vazão agregada é a soma das velocidades que o yt-dlp informa para cada job
+    ativo. A cada ADAPT_INTERVAL segundos: throttling (HTTP 429), muitos erros ou
+    CPU saturada cortam o limite pela metade; se há fila, todos os slots estão em
+    uso e a vazão não caiu, o limite sobe em 1; se a última subida reduziu a
+    vazão, ela é desfeita. Depois de qualquer redução o limite fica parado por
+    ADAPT_DECREASE_COOLDOWN segundos, para não cortar de novo por sinais atrasados.
+    """
+
+    def __init__(self, log, min_jobs, max_jobs, interval=ADAPT_INTERVAL):
+        self.log = log
+        self.min_jobs = min_jobs
+        self.max_jobs = max_jobs
+        self.limit = max(min_jobs, min(DEFAULT_START_JOBS, max_jobs))
+        self.interval = interval
+        self.active = 0
+        self.waiting = 0
+        self.condition = asyncio.Condition()
+        self.speeds = {}
+        self.samples = []
+        self.finished = 0
+        self.errors = 0
+        self.throttled = 0
+        self.last_throughput = None
+        self.increased = False
+        self.decreased_at = None
+
+    @property
+    def adaptive(self):
+        return self.min_jobs < self.max_jobs
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Aguarda uma vaga dentro do limite atual"""
+        async with self.condition:
+            self.waiting += 1
+            try:
+                await self.condition.wait_for(lambda: self.active < self.limit)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.speeds.pop(_job_label.get(), None)
+            async with self.condition:
+                self.condition.notify_all()
+
+    def observe(self, line):
+        """Extrai velocidade e sinais de throttling de uma linha do yt-dlp"""
+        if any(marker in line for marker in THROTTLE_MARKERS):
+            self.throttled += 1
+        match = SPEED_PATTERN.search(line)
+        if match and line.startswith("[download]"):
+            if "100%" in line:
+                # Download do job terminou; o que vem depois é conversão
+                self.speeds.pop(_job_label.get(), None)
+            else:
+                self.speeds[_job_label.get()] = float(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+    def record_result(self, success):
+        self.finished += 1
+        if not success:
+            self.errors += 1
+
+    async def run(self):
+        """Loop de decisão; roda enquanto houver downloads"""
+        if not self.adaptive:
+            return
+        self.log(f"Concorrência adaptativa: começando com {self.limit} (limites {self.min_jobs}-{self.max_jobs})")
+        while True:
+            await asyncio.sleep(ADAPT_SAMPLE)
+            self.samples.append(sum(self.speeds.values()))
+            if len(self.samples) * ADAPT_SAMPLE >= self.interval:
+                await self.adjust()
+
+    async def adjust(self):
+        throughput = sum(self.samples) / len(self.samples)
+        self.samples.clear()
+        error_rate = self.errors / self.finished if self.finished else 0.0
+        load = cpu_load()
+        old = self.limit
+        now = time.monotonic()
+        
+        if self.decreased_at is not None and now - self.decreased_at < ADAPT_DECREASE_COOLDOWN:
+            # Os sinais ainda refletem o limite anterior à última redução
+            new, reason = old, ""
+        elif self.throttled:
+            new, reason = max(self.min_jobs, old // 2), f"throttling detectado ({self.throttled} avisos)"
+        elif self.finished >= 2 and error_rate > ADAPT_MAX_ERROR_RATE:
+            new, reason = max(self.min_jobs, old // 2), f"taxa de erro {error_rate:.0%}"
+        elif load is not None and load > ADAPT_MAX_LOAD:
+            new, reason = max(self.min_jobs, old // 2), f"CPU saturada (carga {load:.2f} por núcleo)"
+        elif self.increased and self.last_throughput and throughput < self.last_throughput * 0.9:
+            new, reason = max(self.min_jobs, old - 1), "o último aumento não melhorou a vazão"
+        elif (self.waiting and self.active >= old
+              and (self.last_throughput is None or throughput >= self.last_throughput * 0.95)):
+            new, reason = min(self.max_jobs, old + 1), "fila cheia e vazão estável"
+        else:
+            new, reason = old, ""
+        
+        if new != old:
+            self.log(f"⚙ Concorrência {old} → {new}: {reason} "
+                     f"(vazão {format_size(throughput)}/s, {self.errors}/{self.finished} erros"
+                     + (f", carga {load:.2f}" if load is not None else "") + ")")
+            self.limit = new
+            if new < old:
+                self.decreased_at = now
+            async with self.condition:
+                self.condition.notify_all()
+        
+        self.increased = new > old
+        self.last_throughput = throughput
+        self.finished = self.errors = self.throttled = 0
+
+
+class RunProfiler:
+    """Perfil de uma execução: CPU do lado Python (cProfile), pico de memória
+    (tracemalloc) e tempo de parede de cada processo filho.
+    
+    Cada thread que roda código do app chama start_thread()/stop_thread();
+    write_report() grava tudo em um único arquivo de texto.
+    """
+
+    def __init__(self, report_path):
+        self.report_path = report_path
+        self.profiles = {}
+        self.spans = []
+        self.snapshot = None
+        self.snapshot_in_use = 0
+        self.peak_bytes = 0
+        self.snapshot_bytes = 0
+        self.snapshot_time = 0.0
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        tracemalloc.start()
+        self.start_thread()
+
+    def start_thread(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: um único cProfile já observa todas as threads
+            return
+        self.profiles[threading.current_thread().name] = profile
+
+    def stop_thread(self):
+        profile = self.profiles.get(threading.current_thread().name)
+        if profile:
+            profile.disable()
+
+    def stop(self):
+        self.stop_thread()
+        self.update_peak(final=True)
+        self.finished = time.perf_counter()
+        tracemalloc.stop()
+
+    def update_peak(self, final=False):
+        # Quando o pico cresce, guarda um snapshot do que está alocado agora; ele
+        # mostra onde a memória está sendo usada, não o conteúdo exato do pico
+        in_use, peak = tracemalloc.get_traced_memory()
+        self.peak_bytes = max(self.peak_bytes, peak)
+        now = time.perf_counter()
+        if peak <= self.snapshot_bytes * PROFILE_SNAPSHOT_GROWTH:
+            return
+        if not final and now - self.snapshot_time < PROFILE_SNAPSHOT_INTERVAL:
+            return
+        self.snapshot_bytes = peak
+        self.snapshot_time = now
+        self.snapshot_in_use = in_use
+        self.snapshot = tracemalloc.take_snapshot()
+
+    @contextlib.contextmanager
+    def span(self, tool, label=""):
+        """Mede o tempo de parede de uma etapa fora do cProfile (processo filho ou E/S em outra thread)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((tool, label, start - self.started, time.perf_counter() - start))
+            self.update_peak()
+
+    def write_report(self):
+        lines = ["Relatório de desempenho - YouTube MP3 Downloader",
+                 f"Gerado em: {datetime.now():%Y-%m-%d %H:%M:%S}",
+                 f"Duração total: {self.finished - self.started:.2f}s", ""]
+        
+        lines.append("== Processos filhos e E/S (tempo de parede) ==")
+        totals = {}
+        for tool, _, _, duration in self.spans:
+            count, total, longest = totals.get(tool, (0, 0.0, 0.0))
+            totals[tool] = (count + 1, total + duration, max(longest, duration))
+        lines.append(f"{'etapa':<12}{'execuções':>10}{'total':>10}{'média':>10}{'máximo':>10}")
+        for tool, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{tool:<12}{count:>10}{total:>9.2f}s{total / count:>9.2f}s{longest:>9.2f}s")
+        lines.append("")
+        lines.append("Mais longos:")
+        for tool, label, offset, duration in sorted(self.spans, key=lambda span: -span[3])[:15]:
+            lines.append(f"  {duration:8.2f}s  +{offset:8.2f}s  {tool} {label}".rstrip())
+        lines.append("")
+        
+        lines.append("== Memória (tracemalloc) ==")
+        lines.append(f"Pico: {format_size(self.peak_bytes)}")
+        if self.snapshot:
+            lines.append(f"Maiores alocações no snapshot mais recente (+{self.snapshot_time - self.started:.2f}s, "
+                         f"{format_size(self.snapshot_in_use)} em uso):")
+            for stat in self.snapshot.statistics("lineno")[:15]:
+                lines.append(f"  {stat}")
+        lines.append("")
+        
+        for thread_name, profile in self.profiles.items():
+            lines.append(f"== CPU (cProfile) - thread {thread_name} ==")
+            stream = io.StringIO()
+            pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(40)
+            lines.append(stream.getvalue())
+        
+        with open(self.report_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines))
+        return self.report_path
+
+
+def default_profile_path(output_dir):
+    return os.path.join(output_dir, f"perfil-{datetime.now():%Y%m%d-%H%M%S}.txt")
+
+
+class YouTubeDownloader:
+    """Motor de download usado tanto pela interface gráfica quanto pela linha de comando.
+    
+    Todos os métodos de download são corrotinas e devem rodar em um único loop asyncio.
+    Os callbacks log/set_status são chamados a partir desse loop.
+    """
+
+    def __init__(self, log=print, set_status=None, min_jobs=DEFAULT_MIN_JOBS, max_jobs=DEFAULT_MAX_JOBS,
+                 session=None, embed_metadata=False, source_cache=None):
+        self.log_callback = log
+        self.set_status = set_status or (lambda message: None)
+        self.min_jobs = min_jobs
+        self.max_jobs = max_jobs
+        self.controller = None
+        self.session = session
+        self.prefetched = {}
+        self.prefetch_queue = {}
+        self.prefetch_tasks = set()
+        self.prefetch_slots = None
+        self.bytes_saved = 0
+        self.profiler = None
+        self.embed_metadata = embed_metadata
+        self.cover_tasks = {}
+        self.thumbnails = ThumbnailCache()
+        self.source_cache = source_cache
+
+    def log(self, message):
+        # Prefixa mensagens de jobs paralelos com o número do job ("[3/40] ...")
+        self.log_callback(_job_label.get() + message)
+
+    def span(self, name):
+        """Mede uma etapa (processo filho, cópia de arquivo) quando o perfil está ativo; sem perfil não faz nada"""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.span(name, _job_label.get().strip())
+
+    @contextlib.asynccontextmanager
+    async def session_command(self, cmd):
+        """Aplica a sessão compartilhada aos comandos do yt-dlp"""
+        if self.session is None or cmd[0] != "yt-dlp":
+            yield cmd
+        else:
+            async with self.session.command(cmd) as session_cmd:
+                yield session_cmd
+
+    async def run_json(self, cmd):
+        """Executa o yt-dlp em modo simulação e retorna o JSON impresso"""
+        async with self.session_command(cmd) as cmd:
+            with self.span(os.path.basename(cmd[0])):
+                process = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+                try:
+                    stdout, stderr = await process.communicate()
+                finally:
+                    await terminate_process(process)
+        if process.returncode != 0:
+            error = stderr.decode("utf-8", "replace").strip().splitlines()
+            raise Exception(f"yt-dlp saiu com código de erro {process.returncode}"
+                            + (f": {error[-1]}" if error else ""))
+        return json.loads(stdout)
+
+    async def run_logged(self, cmd):
+        """Executa um processo filho registrando a saída no log"""
+        async with self.session_command(cmd) as cmd:
+            with self.span(os.path.basename(cmd[0])):
+                process = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+                tail = collections.deque(maxlen=PIPE_TAIL_LINES)
+                last_progress = 0
+                try:
+                    async for raw in read_lines(process.stdout):
+                        if is_progress_line(raw):
+                            # Atualizações de progresso repetidas são descartadas sem decodificar;
+                            # o controlador amostra a velocidade uma vez por segundo
+                            now = time.monotonic()
+                            if now - last_progress < PROGRESS_LOG_INTERVAL and b"100%" not in raw:
+                                continue
+                            last_progress = now
+                        line = raw.decode("utf-8", "replace").strip()
+                        if not line:
+                            continue
+                        if not is_progress_line(raw):
+                            tail.append(line)
+                        self.log(line)
+                        if self.controller:
+                            self.controller.observe(line)
+                    await process.wait()
+                finally:
+                    await terminate_process(process)
+        
+        if process.returncode != 0:
+            # A última linha de ERROR (ou a última linha qualquer) explica a falha
+            reason = next((line for line in reversed(tail) if line.startswith("ERROR")), tail[-1] if tail else "")
+            raise Exception(f"{os.path.basename(cmd[0])} saiu com código de erro {process.returncode}"
+                            + (f": {reason}" if reason else ""))
+
+    async def check_tool(self, cmd):
+        """Retorna True se o comando existir e terminar sem erro"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        except OSError:
+            return False
+        return await process.wait() == 0
+
+    def prefetch_info(self, urls):
+        """Enfileira URLs para a extração de informações em lote, em poucos processos do yt-dlp.
+        
+        Um processo extraindo vários vídeos reaproveita as conexões HTTP e o player
+        já carregado, em vez de pagar esse custo uma vez por job. A extração acompanha
+        os downloads: só PREFETCH_WINDOW informações ficam prontas à frente dos jobs.
+        """
+        for url in urls:
+            if url not in self.prefetched:
+                # dict como conjunto ordenado: mantém a ordem dos jobs
+                self.prefetch_queue.setdefault(url)
+        self.fill_prefetch_window()
+
+    def fill_prefetch_window(self):
+        """Inicia lotes da fila enquanto couberem na janela de informações não usadas"""
+        loop = asyncio.get_running_loop()
+        if self.prefetch_slots is None:
+            self.prefetch_slots = asyncio.Semaphore(PREFETCH_PROCESSES)
+        while self.prefetch_queue and len(self.prefetched) <= PREFETCH_WINDOW - PREFETCH_CHUNK:
+            chunk = list(itertools.islice(self.prefetch_queue, PREFETCH_CHUNK))
+            for url in chunk:
+                del self.prefetch_queue[url]
+            futures = {url: loop.create_future() for url in chunk}
+            self.prefetched.update(futures)
+            task = asyncio.ensure_future(self.fetch_info_chunk(futures))
+            self.prefetch_tasks.add(task)
+            task.add_done_callback(self.prefetch_tasks.discard)
+
+    async def fetch_info_chunk(self, futures):
+        try:
+            async with self.prefetch_slots:
+                cmd = ["yt-dlp", "-j", "--no-playlist", "--ignore-errors", "--", *futures]
+                async with self.session_command(cmd) as cmd:
+                    with self.span("yt-dlp (lote)"):
+                        process = await asyncio.create_subprocess_exec(
+                            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+                            limit=PREFETCH_READ_LIMIT)
+                        try:
+                            # Uma linha JSON por vídeo, na ordem em que forem extraídos
+                            while True:
+                                line = await process.stdout.readline()
+                                if not line:
+                                    break
+                                info = json.loads(line)
+                                for key in ("original_url", "webpage_url"):
+                                    future = futures.get(info.get(key))
+                                    if future and not future.done():
+                                        future.set_result((info, time.monotonic()))
+                                        break
+                            await process.wait()
+                        finally:
+                            await terminate_process(process)
+        except (ValueError, OSError):
+            # Linha grande demais ou JSON inválido: os vídeos restantes são extraídos individualmente
+            pass
+        finally:
+            for future in futures.values():
+                if not future.done():
+                    future.set_result(None)
+
+    async def get_info(self, url):
+        """Informações do vídeo, da extração em lote quando houver ou de um -J individual"""
+        self.prefetch_queue.pop(url, None)
+        future = self.prefetched.pop(url, None)
+        if self.prefetch_queue:
+            # Uma informação a menos na janela: talvez caiba o próximo lote
+            self.fill_prefetch_window()
+        prefetched = await future if future else None
+        info = None
+        if prefetched:
+            info, extracted_at = prefetched
+            if time.monotonic() - extracted_at > PREFETCH_TTL:
+                # Os links de stream podem ter expirado (HTTP 403 no download)
+                info = None
+        if info is None:
+            info = await self.run_json(["yt-dlp", "-J", "--no-playlist", url])
+        return info
+
+    async def expand_playlist(self, url):
+        """Lista o título e as URLs dos vídeos de uma playlist sem extrair cada um deles"""
+        data = await self.run_json(["yt-dlp", "--flat-playlist", "-J", "--yes-playlist", url])
+        entries = [entry for entry in data.get("entries") or [] if entry]
+        if not entries:
+            return None, [url]
+        return data.get("title"), [entry.get("url") or entry.get("webpage_url") for entry in entries]
+
+    async def download_video(self, url, output_dir, quality, is_playlist=False, section=None, split_chapters=False):
+        if section and split_chapters:
+            raise ValueError("Não é possível combinar trecho e divisão por capítulos")
+        
+        self.log(f"Qualidade de áudio: {quality}")
+        if section:
+            start, end = section
+            self.log(f"Trecho: {start:g}s até {f'{end:g}s' if end is not None else 'o fim'}")
+        if split_chapters:
+            self.log("Modo capítulos: um MP3 por capítulo")
+        
+        if not is_playlist:
+            return await self.download_single(url, output_dir, quality, section, split_chapters)
+        
+        # Cada vídeo da playlist é processado separadamente para ter seu próprio formato escolhido
+        album, urls = await self.expand_playlist(url)
+        self.log(f"Playlist com {len(urls)} vídeos.")
+        await self.download_many(urls, output_dir, quality, section, split_chapters, album)
+        return True
+
+    async def download_many(self, urls, output_dir, quality, section=None, split_chapters=False, album=None):
+        """Baixa várias URLs em paralelo (limite adaptativo) e retorna quantas deram certo.
+        
+        Com `album` (título da playlist), cada MP3 recebe o álbum e o número da faixa nas tags.
+        """
+        saved_before = self.bytes_saved
+        cache_before = self.source_cache.stats() if self.source_cache else None
+        finished = 0
+        
+        async def job(i, url):
+            nonlocal finished
+            tags = {"album": album, "track": f"{i}/{len(urls)}"} if album else None
+            try:
+                return await self.run_job(f"[{i}/{len(urls)}] ", url, output_dir, quality, section,
+                                          split_chapters, tags)
+            finally:
+                finished += 1
+                self.set_status(f"Baixando... {finished}/{len(urls)} concluídos "
+                                f"({self.controller.active} em andamento)")
+        
+        async with self.batch_run():
+            self.prefetch_info(urls)
+            results = await asyncio.gather(*(job(i, url) for i, url in enumerate(urls, 1)))
+        success_count = sum(results)
+        
+        self.log(f"\n✓ Download concluído: {success_count}/{len(urls)} arquivos baixados com sucesso.")
+        self.log(f"Economia de transferência: {format_size(self.bytes_saved - saved_before)}")
+        if cache_before:
+            hits, misses, served = (now - before for now, before in zip(self.source_cache.stats(), cache_before))
+            self.log(f"Cache de áudio: {hits} acerto(s), {misses} falta(s), "
+                     f"{format_size(served)} servidos sem download")
+        if not success_count:
+            raise Exception("Nenhum download foi concluído")
+        return success_count
+
+    @contextlib.asynccontextmanager
+    async def batch_run(self):
+        """Mantém o controlador de concorrência ativo durante um lote e encerra a extração em lote ao final"""
+        self.controller = ConcurrencyController(self.log, self.min_jobs, self.max_jobs)
+        task = asyncio.ensure_future(self.controller.run())
+        try:
+            yield self.controller
+        finally:
+            prefetch_tasks = list(self.prefetch_tasks)
+            for pending in [task, *prefetch_tasks]:
+                pending.cancel()
+            await asyncio.gather(task, *prefetch_tasks, return_exceptions=True)
+            self.prefetched.clear()
+            self.prefetch_queue.clear()
+            self.controller = None
+
+    async def run_job(self, label, url, output_dir, quality, section=None, split_chapters=False, tags=None):
+        """Baixa uma URL assim que o controlador liberar uma vaga; retorna False em caso de erro"""
+        _job_label.set(label)
+        async with self.controller.slot():
+            self.log(f"Processando URL: {url}")
+            try:
+                await self.download_single(url, output_dir, quality, section, split_chapters, tags)
+                self.controller.record_result(True)
+                return True
+            except Exception:
+                # O erro já foi registrado; os demais downloads continuam
+                self.controller.record_result(False)
+                return False
+
+    async def watch_folder(self, folder, output_dir, quality, section=None, split_chapters=False):
+        """Baixa as URLs que aparecerem nos arquivos .txt da pasta até ser cancelado"""
+        watcher = FolderWatcher(folder)
+        tasks = set()
+        counts = {"total": 0, "ok": 0, "failed": 0}
+        
+        def job_done(task, url):
+            tasks.discard(task)
+            if not task.cancelled():
+                counts["ok" if task.result() else "failed"] += 1
+                # Jobs cancelados continuam na fila e são retomados na próxima execução
+                watcher.finish(url)
+            self.set_status(f"Monitorando: {counts['ok']} baixados, {counts['failed']} com erro, "
+                            f"{len(tasks)} na fila")
+        
+        self.log(f"Monitorando a pasta {watcher.folder} ({watcher.mode}). Cancele para parar.")
+        self.set_status("Aguardando novas URLs...")
+        changes = watcher.watch()
+        async with self.batch_run():
+            try:
+                async for name, urls in changes:
+                    self.log(f"{len(urls)} nova(s) URL(s) em {name}")
+                    self.prefetch_info(urls)
+                    for url in urls:
+                        counts["total"] += 1
+                        task = asyncio.ensure_future(self.run_job(
+                            f"[{counts['total']}] ", url, output_dir, quality, section, split_chapters))
+                        tasks.add(task)
+                        task.add_done_callback(lambda task, url=url: job_done(task, url))
+            finally:
+                for task in list(tasks):
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await changes.aclose()
+                watcher.close()
+
+    async def download_single(self, url, output_dir, quality, section=None, split_chapters=False, tags=None):
+        # Com cache, o diretório temporário fica no mesmo disco do cache para o áudio ser só renomeado
+        temp_dir = self.source_cache.temp_dir() if self.source_cache else tempfile.mkdtemp()
+        cover_task = None
+        cover = None
+        source = None
+        
+        try:
+            self.log("Obtendo informações do vídeo...")
+            info = await self.get_info(url)
+            format_spec = self.choose_format(info, quality)
+            if self.embed_metadata:
+                # A capa é buscada em paralelo com o download do áudio
+                cover_task = asyncio.ensure_future(self.get_cover(info))
+            
+            source, trim = await self.fetch_source(info, format_spec, quality, temp_dir, section)
+            cover = await cover_task if cover_task else None
+            outputs = self.plan_outputs(info, output_dir, split_chapters, tags or {}, trim)
+            await self.convert_audio(source, outputs, quality, cover)
+            return True
+            
+        except Exception as e:
+            self.log(f"✗ Erro ao baixar: {e}")
+            raise
+        
+        finally:
+            if cover_task and not cover_task.done():
+                cover_task.cancel()
+            if cover:
+                self.thumbnails.release(cover)
+            if self.source_cache and source:
+                self.source_cache.release(source)
+            # Limpar diretório temporário, inclusive quando o download é cancelado
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def choose_format(self, info, quality):
+        """Retorna o seletor de formato para o yt-dlp e registra a escolha no log"""
+        chosen, best = select_audio_format(info, quality)
+        if not chosen:
+            self.log("Nenhum stream só de áudio listado, usando a seleção padrão do yt-dlp")
+            return FALLBACK_FORMAT
+        
+        duration = info.get("duration")
+        chosen_size = estimate_format_size(chosen, duration)
+        saved = max(estimate_format_size(best, duration) - chosen_size, 0)
+        self.bytes_saved += saved
+        self.log(f"Formato de áudio: {chosen['format_id']} ({chosen['acodec']}, {audio_bitrate(chosen):.0f}k, "
+                 f"~{format_size(chosen_size)}) - economia de ~{format_size(saved)}")
+        return chosen["format_id"]
+
+    async def fetch_source(self, info, format_spec, quality, temp_dir, section=None):
+        """Obtém o áudio original do cache ou do YouTube; retorna (caminho, trecho a cortar na conversão)"""
+        cache = self.source_cache
+        if cache is None or format_spec == FALLBACK_FORMAT:
+            return await self.download_source(info, format_spec, temp_dir, section), None
+        
+        video_id = info["id"]
+        async with cache.lock(video_id):
+            path = cache.get(video_id, format_spec, quality)
+            if path:
+                self.log(f"✓ Áudio original encontrado no cache ({format_size(os.path.getsize(path))})")
+                # O cache guarda o áudio completo; o trecho é cortado na conversão
+                return path, section
+            source = await self.download_source(info, format_spec, temp_dir, section)
+            if section:
+                # Um trecho não serve para outras conversões e fica fora do cache
+                return source, None
+            fmt = next(f for f in info["formats"] if f.get("format_id") == format_spec)
+            return cache.put(video_id, fmt, source), None
+
+    async def download_source(self, info, format_spec, temp_dir, section=None):
+        """Baixa apenas o áudio original com o yt-dlp; conversão, tags e capa ficam para o FFmpeg"""
+        # Reaproveita as informações já extraídas em vez de consultar o YouTube de novo
+        info_path = os.path.join(temp_dir, "info.json")
+        with open(info_path, "w", encoding="utf-8") as file:
+            json.dump(info, file)
+        
+        # --newline: uma linha por atualização de progresso, lida em tempo real pelo controlador
+        cmd = ["yt-dlp", "--load-info-json", info_path, "-f", format_spec, "--newline",
+               "-o", os.path.join(temp_dir, "%(id)s.%(ext)s")]
+        if section:
+            start, end = section
+            # O yt-dlp baixa apenas os trechos necessários do stream
+            cmd.extend(["--download-sections", f"*{start}-{end if end is not None else 'inf'}"])
+        
+        self.log("Iniciando download e conversão...")
+        await self.run_logged(cmd)
+        return self.find_source(temp_dir, info)
+
+    def find_source(self, temp_dir, info):
+        """Localiza o áudio original baixado pelo yt-dlp no diretório temporário"""
+        video_id = info["id"]
+        sources = [f for f in os.listdir(temp_dir)
+                   if f.startswith(video_id + ".") and not f.endswith(".json") and not f.endswith(".part")]
+        if not sources:
+            raise Exception(f"Áudio de '{info.get('title', video_id)}' não encontrado")
+        return os.path.join(temp_dir, sources[0])
+
+    def plan_outputs(self, info, output_dir, split_chapters, tags, trim=None):
+        """Lista os MP3 a gerar como (início, fim, caminho, tags): o vídeo inteiro (ou o trecho `trim`)
+        ou um por capítulo"""
+        title = safe_filename(info.get("title") or info["id"])
+        chapters = (info.get("chapters") or []) if split_chapters else []
+        tagged = self.embed_metadata
+        
+        if split_chapters and not chapters:
+            self.log(f"⚠️ '{title}' não possui capítulos, salvando o áudio completo.")
+        if not chapters:
+            file_tags = audio_tags(info, **tags) if tagged else {}
+            start, end = trim or (None, None)
+            return [(start, end, os.path.join(output_dir, title + ".mp3"), file_tags)]
+        
+        chapter_dir = os.path.join(output_dir, title)
+        os.makedirs(chapter_dir, exist_ok=True)
+        outputs = []
+        for number, chapter in enumerate(chapters, 1):
+            chapter_title = chapter.get("title") or "Capítulo"
+            name = safe_filename(f"{number:02d} - {chapter_title}")
+            # Os capítulos de um vídeo formam um álbum com o título do vídeo
+            file_tags = audio_tags(info, info.get("title"), f"{number}/{len(chapters)}",
+                                   chapter_title) if tagged else {}
+            outputs.append((chapter.get("start_time"), chapter.get("end_time"),
+                            os.path.join(chapter_dir, name + ".mp3"), file_tags))
+        self.log(f"Dividindo '{title}' em {len(chapters)} capítulos...")
+        return outputs
+
+    async def convert_audio(self, source, outputs, quality, cover=None):
+        """Gera todos os MP3 de um áudio em uma única passada do FFmpeg, já com tags e capa"""
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", source]
+        if cover:
+            cmd.extend(["-i", cover])
+        
+        streams = ["0:a"] * len(outputs)
+        if any(start is not None or end is not None for start, end, _, _ in outputs):
+            # O áudio é decodificado uma vez e dividido; cada saída recebe só o seu intervalo.
+            # atrim em vez de -ss/-to na saída, que descartariam a capa (um quadro no instante zero)
+            filters = [f"[0:a]asplit={len(outputs)}" + "".join(f"[s{i}]" for i in range(len(outputs)))]
+            for i, (start, end, _, _) in enumerate(outputs):
+                trim = ([f"start={start}"] if start is not None else []) + ([f"end={end}"] if end is not None else [])
+                filters.append(f"[s{i}]atrim={':'.join(trim)},asetpts=PTS-STARTPTS[a{i}]")
+            cmd.extend(["-filter_complex", ";".join(filters)])
+            streams = [f"[a{i}]" for i in range(len(outputs))]
+        
+        # Grava em um .part próprio no destino: sem cópia extra, sem MP3 incompleto com o nome final
+        # e sem colisão entre jobs do mesmo vídeo (URL repetida no lote)
+        parts = [f"{path}.{os.urandom(4).hex()}.part" for _, _, path, _ in outputs]
+        
+        for stream, part, (_, _, path, tags) in zip(streams, parts, outputs):
+            cmd.extend(["-map", stream])
+            if cover:
+                cmd.extend(["-map", "1:v", "-c:v", "copy", "-disposition:v", "attached_pic"])
+            cmd.extend(["-c:a", "libmp3lame", "-b:a", quality, "-map_metadata", "-1", "-id3v2_version", "3"])
+            for key, value in tags.items():
+                cmd.extend(["-metadata", f"{key}={value}"])
+            cmd.extend(["-f", "mp3", part])
+        
+        try:
+            await self.run_logged(cmd)
+        except BaseException:
+            for part in parts:
+                with contextlib.suppress(OSError):
+                    os.remove(part)
+            raise
+        
+        for part, (_, _, path, _) in zip(parts, outputs):
+            os.replace(part, path)
+            self.log(f"✓ Arquivo salvo: {path}")
+
+    async def get_cover(self, info):
+        """Retorna a capa reduzida do vídeo, baixada e redimensionada uma única vez por miniatura.
+        
+        A capa retornada fica protegida no cache até thumbnails.release().
+        """
+        url = select_thumbnail(info)
+        if not url:
+            return None
+        path = self.thumbnails.path(url)
+        if self.thumbnails.acquire(path):
+            return path
+        
+        # Jobs simultâneos com a mesma miniatura aguardam o mesmo download
+        task = self.cover_tasks.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self.fetch_cover(url, path))
+            self.cover_tasks[path] = task
+            task.add_done_callback(lambda _: self.cover_tasks.pop(path, None))
+        try:
+            await asyncio.shield(task)
+            if self.thumbnails.acquire(path):
+                return path
+            return None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.log(f"⚠️ Capa indisponível, salvando sem capa: {e}")
+            return None
+
+    async def fetch_cover(self, url, path):
+        """Baixa a miniatura (jpg ou webp) e a converte em um JPEG de no máximo COVER_SIZE pixels"""
+        os.makedirs(self.thumbnails.directory, exist_ok=True)
+        temp_path = path + ".part"
+        try:
+            await self.run_logged(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", url,
+                                   "-vf", f"scale='min({COVER_SIZE},iw)':-2", "-frames:v", "1", "-q:v", "3",
+                                   "-f", "mjpeg", temp_path])
+            os.replace(temp_path, path)
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+        self.thumbnails.evict()
+
+    async def download_from_file(self, file_path, output_dir, quality, section=None, split_chapters=False):
+        try:
+            with open(file_path, 'r') as file:
+                urls = [line.strip() for line in file if line.strip()]
+            
+            if not urls:
+                self.log("✗ O arquivo está vazio ou não contém URLs válidas.")
+                raise Exception("O arquivo não contém URLs válidas")
+            
+            self.log(f"Encontradas {len(urls)} URLs para baixar.")
+            await self.download_many(urls, output_dir, quality, section, split_chapters)
+            return True
+            
+        except Exception as e:
+            self.log(f"✗ Erro ao processar arquivo: {e}")
+            raise
+
+
+async def terminate_process(process):
+    """Encerra o processo filho caso ainda esteja rodando (ex.: download cancelado)"""
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+
+
+class EventLoopThread:
+    """Mantém um único loop asyncio rodando em uma thread de segundo plano"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="asyncio-loop", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Agenda a corrotina no loop; o Future retornado pode ser cancelado de qualquer thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def shutdown(self, timeout=3):
+        """Cancela as tarefas pendentes (encerrando os processos filhos) e para o loop"""
+        async def cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        try:
+            self.submit(cancel_all()).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class TkBridge:
+    """Ponte thread-safe para executar chamadas no loop principal do Tk.
+    
+    O Tk não pode ser usado fora da thread principal; o loop asyncio enfileira
+    as chamadas aqui e o Tk as executa periodicamente via after().
+    """
+
+    def __init__(self, root, interval=50):
+        self.root = root
+        self.interval = interval
+        self.queue = queue.Queue()
+        self.root.after(self.interval, self.poll)
+
+    def call(self, func, *args):
+        """Agenda func(*args) na thread do Tk e retorna um concurrent.futures.Future com o resultado"""
+        future = concurrent.futures.Future()
+        self.queue.put((future, func, args))
+        return future
+
+    async def run(self, func, *args):
+        """Versão aguardável de call(), para uso dentro do loop asyncio"""
+        return await asyncio.wrap_future(self.call(func, *args))
+
+    def poll(self):
+        while True:
+            try:
+                future, func, args = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+        self.root.after(self.interval, self.poll)
+
+
 class YouTubeDownloaderGUI:
-    def __init__(self, root):
+    def __init__(self, root, profile=None):
+        # profile: None desativa; "" grava na pasta de destino; outro valor é o caminho do relatório
         self.root = root
         self.root.title("YouTube MP3 Downloader")
         self.root.resizable(False, False)
-        self.root.geometry("600x500")
+        self.root.geometry("600x620")
         
         # Configurar ícone caso esteja empacotado como executável
         try:
@@ -34,7 +1615,7 @@ class YouTubeDownloaderGUI:
             pass
         
         # Variáveis
-        self.download_dir = os.path.join(str(Path.home()), "Downloads")
+        self.download_dir = DEFAULT_DOWNLOAD_DIR
         self.download_in_progress = False
         self.quality_var = tk.StringVar(value="320k")
         self.url_var = tk.StringVar()
@@ -42,6 +1623,27 @@ class YouTubeDownloaderGUI:
         self.progress_var = tk.DoubleVar(value=0)
         self.download_type = tk.StringVar(value="single")
         self.file_path = tk.StringVar()
+        self.watch_dir = tk.StringVar()
+        self.section_mode = tk.StringVar(value="full")
+        self.section_start = tk.StringVar()
+        self.section_end = tk.StringVar()
+        
+        self.max_jobs = tk.IntVar(value=DEFAULT_MAX_JOBS)
+        self.profile_enabled = tk.BooleanVar(value=profile is not None)
+        self.profile_path = profile or None
+        self.embed_metadata = tk.BooleanVar(value=False)
+        self.use_source_cache = tk.BooleanVar(value=False)
+        self.current_job = None
+        self.profiler = None
+        
+        # O motor roda em um loop asyncio próprio; toda alteração na interface passa pela ponte
+        self.bridge = TkBridge(self.root)
+        self.loop_thread = EventLoopThread()
+        self.downloader = YouTubeDownloader(
+            log=lambda message: self.bridge.call(self.log, message),
+            set_status=lambda message: self.bridge.call(self.status_var.set, message),
+            session=SessionStore())
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Configuração da interface
         self.setup_ui()
@@ -71,6 +1673,9 @@ class YouTubeDownloaderGUI:
         batch_radio = ttk.Radiobutton(self.type_frame, text="Lista de URLs de um arquivo", variable=self.download_type, value="batch")
         batch_radio.grid(row=0, column=2, padx=10, sticky=tk.W)
         
+        watch_radio = ttk.Radiobutton(self.type_frame, text="Monitorar pasta", variable=self.download_type, value="watch")
+        watch_radio.grid(row=1, column=0, padx=10, pady=(5, 0), sticky=tk.W)
+        
         # Criar os dois frames (para url e batch) mas inicialmente não empacotar nenhum
         # URL input frame
         self.url_frame = ttk.Frame(self.main_frame)
@@ -90,6 +1695,17 @@ class YouTubeDownloaderGUI:
         browse_button = ttk.Button(file_entry_frame, text="Procurar", command=self.browse_file)
         browse_button.pack(side=tk.RIGHT, padx=(5, 0))
         
+        # Frame para pasta monitorada (watch mode)
+        self.watch_frame = ttk.Frame(self.main_frame)
+        watch_label = ttk.Label(self.watch_frame, text="Pasta monitorada (novas URLs em arquivos .txt):")
+        watch_label.pack(anchor=tk.W)
+        watch_entry_frame = ttk.Frame(self.watch_frame)
+        watch_entry_frame.pack(fill=tk.X, pady=(5, 0))
+        watch_entry = ttk.Entry(watch_entry_frame, textvariable=self.watch_dir, width=50)
+        watch_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        watch_button = ttk.Button(watch_entry_frame, text="Procurar", command=self.browse_watch_dir)
+        watch_button.pack(side=tk.RIGHT, padx=(5, 0))
+        
         # Qualidade de áudio frame - será usado como referência de posicionamento
         self.quality_frame = ttk.LabelFrame(self.main_frame, text="Qualidade do Áudio", padding="10")
         self.quality_frame.pack(fill=tk.X, pady=(0, 10))
@@ -106,6 +1722,46 @@ class YouTubeDownloaderGUI:
         quality_320 = ttk.Radiobutton(self.quality_frame, text="Muito Alta (320k)", variable=self.quality_var, value="320k")
         quality_320.grid(row=0, column=3, padx=10, sticky=tk.W)
         
+        # Trecho / capítulos
+        self.section_frame = ttk.LabelFrame(self.main_frame, text="Conteúdo", padding="10")
+        self.section_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        full_radio = ttk.Radiobutton(self.section_frame, text="Vídeo completo", variable=self.section_mode, value="full")
+        full_radio.grid(row=0, column=0, padx=10, sticky=tk.W)
+        
+        section_radio = ttk.Radiobutton(self.section_frame, text="Trecho", variable=self.section_mode, value="section")
+        section_radio.grid(row=0, column=1, padx=10, sticky=tk.W)
+        
+        chapters_radio = ttk.Radiobutton(self.section_frame, text="Um MP3 por capítulo", variable=self.section_mode, value="chapters")
+        chapters_radio.grid(row=0, column=2, padx=10, sticky=tk.W)
+        
+        time_frame = ttk.Frame(self.section_frame)
+        time_frame.grid(row=1, column=0, columnspan=3, padx=10, pady=(5, 0), sticky=tk.W)
+        
+        ttk.Label(time_frame, text="Início:").pack(side=tk.LEFT)
+        self.section_start_entry = ttk.Entry(time_frame, textvariable=self.section_start, width=10)
+        self.section_start_entry.pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(time_frame, text="Fim:").pack(side=tk.LEFT)
+        self.section_end_entry = ttk.Entry(time_frame, textvariable=self.section_end, width=10)
+        self.section_end_entry.pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(time_frame, text="(HH:MM:SS)", foreground="gray").pack(side=tk.LEFT)
+        
+        ttk.Label(time_frame, text="Máx. simultâneos:").pack(side=tk.LEFT, padx=(25, 0))
+        jobs_spinbox = ttk.Spinbox(time_frame, from_=1, to=16, textvariable=self.max_jobs, width=4)
+        jobs_spinbox.pack(side=tk.LEFT, padx=(5, 0))
+        
+        profile_check = ttk.Checkbutton(self.section_frame, text="Gerar relatório de desempenho", variable=self.profile_enabled)
+        profile_check.grid(row=2, column=0, columnspan=2, padx=10, pady=(5, 0), sticky=tk.W)
+        
+        metadata_check = ttk.Checkbutton(self.section_frame, text="Incluir tags e capa", variable=self.embed_metadata)
+        metadata_check.grid(row=2, column=2, padx=10, pady=(5, 0), sticky=tk.W)
+        
+        cache_check = ttk.Checkbutton(self.section_frame, text="Guardar áudio original em cache (evita baixar de novo)",
+                                      variable=self.use_source_cache)
+        cache_check.grid(row=3, column=0, columnspan=3, padx=10, pady=(5, 0), sticky=tk.W)
+        
         # Pasta de destino
         dest_frame = ttk.Frame(self.main_frame)
         dest_frame.pack(fill=tk.X, pady=(0, 10))
@@ -129,6 +1785,9 @@ class YouTubeDownloaderGUI:
         self.download_button = ttk.Button(button_frame, text="Baixar MP3", command=self.start_download)
         self.download_button.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
+        self.cancel_button = ttk.Button(button_frame, text="Cancelar", command=self.cancel_download, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.RIGHT, padx=(5, 0))
+        
         # Barra de progresso
         progress_frame = ttk.Frame(self.main_frame)
         progress_frame.pack(fill=tk.X, pady=(10, 0))
@@ -163,9 +1822,11 @@ class YouTubeDownloaderGUI:
         
         # Bind de eventos
         self.download_type.trace_add("write", self.on_download_type_change)
+        self.section_mode.trace_add("write", self.on_section_mode_change)
         
         # Inicializar estado dos frames de entrada
         self.on_download_type_change()
+        self.on_section_mode_change()
 
     def choose_download_dir(self):
         """Abre diálogo para escolher a pasta de download"""
@@ -190,14 +1851,37 @@ class YouTubeDownloaderGUI:
         except:
             pass
         
+        try:
+            self.watch_frame.pack_forget()
+        except:
+            pass
+        
         # Mostrar o frame adequado baseado na seleção
         if self.download_type.get() == "batch":
             # Usar o widget quality_frame como referência para posicionamento
             self.batch_frame.pack(fill=tk.X, pady=(0, 10), before=self.quality_frame)
+        elif self.download_type.get() == "watch":
+            self.watch_frame.pack(fill=tk.X, pady=(0, 10), before=self.quality_frame)
         else:
             # Usar o widget quality_frame como referência para posicionamento
             self.url_frame.pack(fill=tk.X, pady=(0, 10), before=self.quality_frame)
 
+    def on_section_mode_change(self, *args):
+        state = tk.NORMAL if self.section_mode.get() == "section" else tk.DISABLED
+        self.section_start_entry.config(state=state)
+        self.section_end_entry.config(state=state)
+
+    def get_section(self):
+        """Retorna o trecho selecionado em segundos ou None para o vídeo completo"""
+        if self.section_mode.get() != "section":
+            return None
+        return parse_section(self.section_start.get(), self.section_end.get())
+
+    def browse_watch_dir(self):
+        folder = filedialog.askdirectory(title="Selecione a pasta a monitorar")
+        if folder:
+            self.watch_dir.set(folder)
+
     def browse_file(self):
         file_path = filedialog.askopenfilename(
             title="Selecione o arquivo com URLs",
@@ -212,58 +1896,56 @@ class YouTubeDownloaderGUI:
         self.log_text.see(tk.END)
         self.root.update_idletasks()
 
-    def check_requirements_async(self):
-        thread = threading.Thread(target=self.check_requirements)
-        thread.daemon = True
-        thread.start()
+    def ui(self, func, *args):
+        """Agenda uma alteração na interface a partir do loop asyncio"""
+        return self.bridge.call(func, *args)
 
-    def check_requirements(self):
+    def check_requirements_async(self):
         self.status_var.set("Verificando requisitos...")
         self.progress_bar.start(10)
         self.download_button.config(state=tk.DISABLED)
-        
-        self.log("Verificando requisitos do sistema...")
+        self.loop_thread.submit(self.check_requirements())
+
+    async def check_requirements(self):
+        log = self.downloader.log
+        log("Verificando requisitos do sistema...")
         
         # Verificar yt-dlp
-        try:
-            subprocess.run(["yt-dlp", "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            self.log("✓ yt-dlp encontrado!")
-        except (subprocess.SubprocessError, FileNotFoundError):
-            self.log("✗ yt-dlp não encontrado. Instalando...")
-            try:
-                subprocess.run([sys.executable, "-m", "pip", "install", "yt-dlp"], 
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-                self.log("✓ yt-dlp instalado com sucesso!")
-            except subprocess.SubprocessError as e:
-                self.log(f"✗ Falha ao instalar yt-dlp: {e}")
-                messagebox.showerror("Erro", "Não foi possível instalar yt-dlp. Tente instalar manualmente com: pip install yt-dlp")
+        if await self.downloader.check_tool(["yt-dlp", "--version"]):
+            log("✓ yt-dlp encontrado!")
+        else:
+            log("✗ yt-dlp não encontrado. Instalando...")
+            if await self.downloader.check_tool([sys.executable, "-m", "pip", "install", "yt-dlp"]):
+                log("✓ yt-dlp instalado com sucesso!")
+            else:
+                log("✗ Falha ao instalar yt-dlp")
+                self.ui(messagebox.showerror, "Erro", "Não foi possível instalar yt-dlp. Tente instalar manualmente com: pip install yt-dlp")
         
         # Verificar FFmpeg
-        try:
-            subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            self.log("✓ FFmpeg encontrado!")
-        except (subprocess.SubprocessError, FileNotFoundError):
-            self.log("⚠️ FFmpeg não encontrado! A conversão para MP3 pode falhar.")
+        if await self.downloader.check_tool(["ffmpeg", "-version"]):
+            log("✓ FFmpeg encontrado!")
+        else:
+            log("⚠️ FFmpeg não encontrado! A conversão para MP3 pode falhar.")
             if platform.system() == "Windows":
-                self.log("Recomendado: Instale o FFmpeg via Chocolatey com: choco install ffmpeg -y")
+                log("Recomendado: Instale o FFmpeg via Chocolatey com: choco install ffmpeg -y")
             elif platform.system() == "Darwin":
-                self.log("Recomendado: Instale o FFmpeg via Homebrew com: brew install ffmpeg")
+                log("Recomendado: Instale o FFmpeg via Homebrew com: brew install ffmpeg")
             else:
-                self.log("Recomendado: Instale o FFmpeg via gerenciador de pacotes: sudo apt install ffmpeg")
+                log("Recomendado: Instale o FFmpeg via gerenciador de pacotes: sudo apt install ffmpeg")
             
-            result = messagebox.askokcancel("Aviso", 
+            result = await self.bridge.run(messagebox.askokcancel, "Aviso", 
                 "FFmpeg não foi encontrado no sistema. Isso pode causar falhas na conversão para MP3.\n\n"
                 "Deseja continuar mesmo assim? (Recomendamos instalar o FFmpeg para melhor funcionamento)")
             
             if not result:
-                self.root.quit()
+                self.ui(self.root.quit)
                 return
         
-        self.log("Verificação de requisitos concluída!")
-        self.progress_bar.stop()
-        self.progress_var.set(0)
-        self.status_var.set("Pronto para download")
-        self.download_button.config(state=tk.NORMAL)
+        log("Verificação de requisitos concluída!")
+        self.ui(self.progress_bar.stop)
+        self.ui(self.progress_var.set, 0)
+        self.ui(self.status_var.set, "Pronto para download")
+        self.ui(self.download_button.config, {"state": tk.NORMAL})
 
     def start_download(self):
         # Validar entrada
@@ -274,12 +1956,24 @@ class YouTubeDownloaderGUI:
             if not file_path or not os.path.exists(file_path):
                 messagebox.showerror("Erro", "Por favor, selecione um arquivo de texto válido com URLs")
                 return
+        elif download_type == "watch":
+            watch_dir = self.watch_dir.get().strip()
+            if not watch_dir or not os.path.isdir(watch_dir):
+                messagebox.showerror("Erro", "Por favor, selecione uma pasta válida para monitorar")
+                return
         else:
             url = self.url_var.get().strip()
             if not url or not (url.startswith("http://") or url.startswith("https://")):
                 messagebox.showerror("Erro", "Por favor, insira uma URL válida do YouTube")
                 return
         
+        # Validar trecho
+        try:
+            self.get_section()
+        except ValueError as e:
+            messagebox.showerror("Erro", str(e))
+            return
+        
         # Validar pasta de destino
         if not os.path.exists(self.download_dir):
             try:
@@ -293,138 +1987,190 @@ class YouTubeDownloaderGUI:
         if self.download_in_progress:
             return
         
-        # Iniciar thread de download
+        try:
+            self.downloader.max_jobs = max(1, self.max_jobs.get())
+        except tk.TclError:
+            self.downloader.max_jobs = DEFAULT_MAX_JOBS
+        
+        # Os valores da interface são lidos aqui, na thread do Tk, e passados ao loop asyncio
+        if download_type == "batch":
+            self.status_var.set("Baixando vários vídeos do arquivo...")
+            self.log(f"Iniciando download em lote do arquivo: {file_path}")
+            coro = self.downloader.download_from_file(
+                file_path, self.download_dir, self.quality_var.get(),
+                section=self.get_section(), split_chapters=self.section_mode.get() == "chapters")
+        elif download_type == "watch":
+            self.status_var.set("Monitorando pasta...")
+            coro = self.downloader.watch_folder(
+                watch_dir, self.download_dir, self.quality_var.get(),
+                section=self.get_section(), split_chapters=self.section_mode.get() == "chapters")
+        else:
+            is_playlist = (download_type == "playlist")
+            if is_playlist:
+                self.status_var.set("Baixando playlist...")
+                self.log(f"Iniciando download da playlist: {url}")
+            else:
+                self.status_var.set("Baixando vídeo...")
+                self.log(f"Iniciando download do vídeo: {url}")
+            coro = self.downloader.download_video(
+                url, self.download_dir, self.quality_var.get(), is_playlist,
+                section=self.get_section(), split_chapters=self.section_mode.get() == "chapters")
+        
+        self.profiler = None
+        if self.profile_enabled.get():
+            self.profiler = RunProfiler(self.profile_path or default_profile_path(self.download_dir))
+            self.profiler.start()
+        self.downloader.profiler = self.profiler
+        self.downloader.embed_metadata = self.embed_metadata.get()
+        if self.use_source_cache.get() != (self.downloader.source_cache is not None):
+            self.downloader.source_cache = SourceCache() if self.use_source_cache.get() else None
+        
         self.download_in_progress = True
         self.progress_bar.start(10)
         self.download_button.config(state=tk.DISABLED)
-        
-        thread = threading.Thread(target=self.perform_download)
-        thread.daemon = True
-        thread.start()
+        self.cancel_button.config(state=tk.NORMAL)
+        self.current_job = self.loop_thread.submit(self.perform_download(coro))
+
+    def cancel_download(self):
+        if self.current_job:
+            self.log("Cancelando download...")
+            self.current_job.cancel()
 
-    def perform_download(self):
+    def on_close(self):
+        # Cancelar os jobs encerra os processos filhos antes de fechar
+        self.loop_thread.shutdown()
+        self.root.destroy()
+
+    async def perform_download(self, coro):
+        if self.profiler:
+            self.profiler.start_thread()
         try:
-            download_type = self.download_type.get()
-            quality = self.quality_var.get()
-            
-            if download_type == "batch":
-                self.status_var.set("Baixando vários vídeos do arquivo...")
-                self.log(f"Iniciando download em lote do arquivo: {self.file_path.get()}")
-                self.download_from_file(self.file_path.get(), self.download_dir, quality)
-            else:
-                url = self.url_var.get().strip()
-                is_playlist = (download_type == "playlist")
-                
-                if is_playlist:
-                    self.status_var.set("Baixando playlist...")
-                    self.log(f"Iniciando download da playlist: {url}")
-                else:
-                    self.status_var.set("Baixando vídeo...")
-                    self.log(f"Iniciando download do vídeo: {url}")
-                
-                self.download_video(url, self.download_dir, quality, is_playlist)
+            await coro
             
-            self.status_var.set("Download concluído com sucesso!")
-            messagebox.showinfo("Sucesso", f"Download concluído!\nArquivos salvos em: {self.download_dir}")
+            self.ui(self.status_var.set, "Download concluído com sucesso!")
+            self.ui(messagebox.showinfo, "Sucesso", f"Download concluído!\nArquivos salvos em: {self.download_dir}")
             
+        except asyncio.CancelledError:
+            self.ui(self.status_var.set, "Download cancelado")
+            self.ui(self.log, "✗ Download cancelado pelo usuário")
+        
         except Exception as e:
-            self.status_var.set(f"Erro: {e}")
-            self.log(f"❌ Erro durante o download: {e}")
-            messagebox.showerror("Erro", f"Ocorreu um erro durante o download:\n{e}")
+            self.ui(self.status_var.set, f"Erro: {e}")
+            self.ui(self.log, f"❌ Erro durante o download: {e}")
+            self.ui(messagebox.showerror, "Erro", f"Ocorreu um erro durante o download:\n{e}")
         
         finally:
-            self.progress_bar.stop()
-            self.progress_var.set(0)
-            self.download_button.config(state=tk.NORMAL)
-            self.download_in_progress = False
+            if self.profiler:
+                self.profiler.stop_thread()
+            self.ui(self.finish_download)
 
-    def download_video(self, url, output_dir, quality, is_playlist=False):
-        temp_dir = tempfile.mkdtemp()
-        output_pattern = os.path.join(temp_dir, "%(title)s.%(ext)s")
-        
-        cmd = ["yt-dlp", "-x", "--audio-format", "mp3", "--audio-quality", quality]
-        if is_playlist:
-            cmd.append("--yes-playlist")
-        cmd.extend(["-o", output_pattern, url])
-        
-        self.log(f"Qualidade de áudio: {quality}")
-        self.log("Iniciando download e conversão...")
+    def finish_download(self):
+        self.progress_bar.stop()
+        self.progress_var.set(0)
+        self.download_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.download_in_progress = False
+        self.current_job = None
         
-        try:
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
-            
-            # Ler saída linha por linha
-            for line in process.stdout:
-                line = line.strip()
-                if line:
-                    self.log(line)
-            
-            process.wait()
-            
-            if process.returncode != 0:
-                raise Exception(f"yt-dlp saiu com código de erro {process.returncode}")
-            
-            # Mover arquivos MP3 para o diretório de saída
-            found_files = False
-            for file in os.listdir(temp_dir):
-                if file.endswith(".mp3"):
-                    found_files = True
-                    src = os.path.join(temp_dir, file)
-                    dst = os.path.join(output_dir, file)
-                    shutil.move(src, dst)
-                    self.log(f"✓ Arquivo salvo: {dst}")
-            
-            if not found_files:
-                self.log("⚠️ Nenhum arquivo MP3 foi gerado. Verifique se o FFmpeg está instalado corretamente.")
-            
-            # Limpar diretório temporário
-            shutil.rmtree(temp_dir)
-            return True
-            
-        except Exception as e:
-            self.log(f"✗ Erro ao baixar: {e}")
-            # Tentar limpar diretório temporário em caso de erro
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
-            raise
+        if self.profiler:
+            self.profiler.stop()
+            self.log(f"Relatório de desempenho salvo em: {self.profiler.write_report()}")
+            self.profiler = self.downloader.profiler = None
 
-    def download_from_file(self, file_path, output_dir, quality):
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Baixa vídeos do YouTube e converte para MP3. Sem URL ou arquivo, abre a interface gráfica.")
+    parser.add_argument("url", nargs="?", help="URL do vídeo ou playlist")
+    parser.add_argument("--file", help="arquivo de texto com uma URL por linha")
+    parser.add_argument("--watch", metavar="PASTA",
+                        help="monitorar a pasta e baixar as URLs acrescentadas aos arquivos .txt")
+    parser.add_argument("--playlist", action="store_true", help="baixar a playlist completa")
+    parser.add_argument("--quality", choices=QUALITIES, default="320k", help="qualidade do MP3 (padrão: 320k)")
+    parser.add_argument("--output", default=DEFAULT_DOWNLOAD_DIR, help="pasta de destino")
+    parser.add_argument("--start", help="início do trecho (HH:MM:SS)")
+    parser.add_argument("--end", help="fim do trecho (HH:MM:SS)")
+    parser.add_argument("--split-chapters", action="store_true", help="gerar um MP3 por capítulo")
+    parser.add_argument("--tags", action="store_true",
+                        help="gravar título, artista, álbum, faixa, URL de origem e capa em cada MP3")
+    parser.add_argument("--source-cache", action="store_true",
+                        help="guardar o áudio original em cache para conversões repetidas")
+    parser.add_argument("--source-cache-size", type=int, default=DEFAULT_SOURCE_CACHE_MB, metavar="MIB",
+                        help=f"tamanho máximo do cache de áudio em MiB (padrão: {DEFAULT_SOURCE_CACHE_MB})")
+    parser.add_argument("--cookies", metavar="ARQUIVO",
+                        help="importar cookies (formato Netscape) para a sessão compartilhada")
+    parser.add_argument("--no-session", action="store_true",
+                        help="não usar o cookie jar compartilhado entre jobs e execuções")
+    parser.add_argument("--profile", nargs="?", const="", metavar="ARQUIVO",
+                        help="gravar um relatório de desempenho (padrão: perfil-<data>.txt na pasta de destino)")
+    parser.add_argument("--min-jobs", type=int, default=DEFAULT_MIN_JOBS,
+                        help=f"mínimo de downloads simultâneos em playlists e lotes (padrão: {DEFAULT_MIN_JOBS})")
+    parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS,
+                        help=f"máximo de downloads simultâneos; o número real é ajustado pela vazão (padrão: {DEFAULT_MAX_JOBS})")
+    parser.add_argument("--jobs", type=int,
+                        help="número fixo de downloads simultâneos (desativa o ajuste automático)")
+    args = parser.parse_args(argv)
+    
+    if sum(1 for source in (args.url, args.file, args.watch) if source) > 1:
+        parser.error("informe apenas uma origem: URL, --file ou --watch")
+    if (args.start or args.end) and args.split_chapters:
+        parser.error("--start/--end não podem ser usados com --split-chapters")
+    if args.cookies and args.no_session:
+        parser.error("--cookies precisa da sessão compartilhada (remova --no-session)")
+    if args.jobs is not None:
+        args.min_jobs = args.max_jobs = args.jobs
+    if args.min_jobs < 1 or args.max_jobs < args.min_jobs:
+        parser.error("os limites de downloads simultâneos devem satisfazer 1 <= --min-jobs <= --max-jobs")
+    try:
+        args.section = parse_section(args.start, args.end) if (args.start or args.end) else None
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def run_cli(args):
+    session = None if args.no_session else SessionStore()
+    if args.cookies:
         try:
-            with open(file_path, 'r') as file:
-                urls = [line.strip() for line in file if line.strip()]
-            
-            if not urls:
-                self.log("✗ O arquivo está vazio ou não contém URLs válidas.")
-                raise Exception("O arquivo não contém URLs válidas")
-            
-            self.log(f"Encontradas {len(urls)} URLs para baixar.")
-            
-            success_count = 0
-            for i, url in enumerate(urls, 1):
-                self.log(f"\n[{i}/{len(urls)}] Processando URL: {url}")
-                self.status_var.set(f"Baixando {i}/{len(urls)}: {url[:30]}...")
-                if self.download_video(url, output_dir, quality):
-                    success_count += 1
-            
-            self.log(f"\n✓ Download concluído: {success_count}/{len(urls)} arquivos baixados com sucesso.")
-            return True
-            
-        except Exception as e:
-            self.log(f"✗ Erro ao processar arquivo: {e}")
-            raise
+            print(f"✓ {session.merge_cookies(args.cookies, strict=True)} cookies na sessão compartilhada")
+        except OSError as e:
+            print(f"✗ Não foi possível importar os cookies de {args.cookies}: {e}", file=sys.stderr)
+            return 2
+    source_cache = SourceCache(args.source_cache_size * 1024 ** 2) if args.source_cache else None
+    downloader = YouTubeDownloader(min_jobs=args.min_jobs, max_jobs=args.max_jobs, session=session,
+                                   embed_metadata=args.tags, source_cache=source_cache)
+    os.makedirs(args.output, exist_ok=True)
+    if args.profile is not None:
+        downloader.profiler = RunProfiler(args.profile or default_profile_path(args.output))
+        downloader.profiler.start()
+    try:
+        if args.watch:
+            coro = downloader.watch_folder(args.watch, args.output, args.quality,
+                                           section=args.section, split_chapters=args.split_chapters)
+        elif args.file:
+            coro = downloader.download_from_file(args.file, args.output, args.quality,
+                                                 section=args.section, split_chapters=args.split_chapters)
+        else:
+            coro = downloader.download_video(args.url, args.output, args.quality, args.playlist,
+                                             section=args.section, split_chapters=args.split_chapters)
+        asyncio.run(coro)
+    except KeyboardInterrupt:
+        print("✗ Download cancelado pelo usuário", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"❌ Erro durante o download: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if downloader.profiler:
+            downloader.profiler.stop()
+            print(f"Relatório de desempenho salvo em: {downloader.profiler.write_report()}")
+    return 0
 
 def main():
+    args = parse_args()
+    if args.url or args.file or args.watch:
+        sys.exit(run_cli(args))
+    
     root = tk.Tk()
-    app = YouTubeDownloaderGUI(root)
+    app = YouTubeDownloaderGUI(root, profile=args.profile)
     root.mainloop()
 
 if __name__ == "__main__":